@@ -3,7 +3,6 @@
 """
 
 from typing import List, Dict, Any, Callable, Optional
-import re
 
 
 class DocumentConfig:
@@ -56,7 +55,8 @@ class UncertaintyEngine:
             return True
         
         if field_name == 'registration_number':
-            digits_count = len(re.findall(r'\d', original_text))
+            # str.isdecimal совпадает с \d, но считает без списка совпадений
+            digits_count = sum(map(str.isdecimal, original_text))
             return digits_count < config.get('min_reg_digits', 3)
         
         elif field_name == 'full_name':
@@ -4,14 +4,101 @@ OCR движок с Tesseract для распознавания документ
 """
 
 import pytesseract
-from PIL import Image, ImageEnhance, ImageFilter, ImageDraw
-import cv2
+from PIL import Image, ImageDraw
 import numpy as np
-from typing import Tuple, Dict, Any, List
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Tuple, Dict, Any, List, Optional
 import logging
 
+from core.image_processor import AdvancedImageProcessor, resize_array, load_label_font
+
 logger = logging.getLogger(__name__)
 
+try:
+    # Необязательная зависимость: libtesseract в том же процессе, без запуска tesseract
+    # и повторной загрузки языковых моделей на каждое поле
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+# Режим движка Tesseract (3 - по умолчанию: LSTM, если доступен)
+TESSERACT_OEM = 3
+
+# Переменные Tesseract для всех полей: после предобработки текст всегда темный на
+# светлом, поэтому повторное распознавание строк с низкой уверенностью в инверсии
+# (tessedit_do_invert) только тратит время
+TESSERACT_VARIABLES = {'tessedit_do_invert': '0'}
+
+
+def _ocr_concurrency() -> int:
+    """
+    Число потоков распознавания: переменная окружения OCR_CONCURRENCY или число ядер
+    
+    Поля распознаются параллельно, по одному экземпляру Tesseract на поток, и
+    внутренний OpenMP Tesseract только конкурирует с ними за ядра. Поэтому сервис
+    запускается с OMP_THREAD_LIMIT=1 (Dockerfile, readme): переменная действует на
+    весь процесс и должна быть задана до его запуска, модуль ее не меняет.
+    """
+    value = os.environ.get('OCR_CONCURRENCY')
+    if value:
+        try:
+            return max(1, int(value))
+        except ValueError:
+            logger.warning(f"Некорректное значение OCR_CONCURRENCY: {value!r}")
+    return os.cpu_count() or 1
+
+
+@lru_cache(maxsize=None)
+def _tesseract_config(psm: int) -> str:
+    """Строка параметров Tesseract для режима PSM (собирается один раз на PSM)"""
+    variables = ' '.join(f'-c {name}={value}' for name, value in TESSERACT_VARIABLES.items())
+    return f'--oem {TESSERACT_OEM} --psm {psm} {variables}'
+
+
+# Кэш результатов распознавания по содержимому подготовленной области:
+# шаблонные поля и повторные загрузки тех же документов не распознаются заново.
+# Только в памяти процесса: распознанный текст документов (персональные данные)
+# не остается на диске, а смена параметров Tesseract между запусками не отдает старый текст
+OCR_CACHE_SIZE = 4096  # записей
+
+_ocr_cache: "OrderedDict[str, str]" = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+
+def _ocr_cache_key(region: Image.Image, lang: str, psm: int, backend: str) -> str:
+    """
+    Ключ кэша: хэш пикселей области (blake2b из hashlib) и все настройки распознавания -
+    язык, полная строка параметров Tesseract (OEM, PSM, переменные) и движок
+    """
+    digest = hashlib.blake2b(region.tobytes(), digest_size=16)
+    digest.update(f"{region.mode}{region.size}|{lang}|{_tesseract_config(psm)}|{backend}".encode())
+    return digest.hexdigest()
+
+
+def _load_cached_text(key: str) -> Optional[str]:
+    """Распознанный текст из кэша или None"""
+    with _ocr_cache_lock:
+        text = _ocr_cache.get(key)
+        if text is not None:
+            _ocr_cache.move_to_end(key)
+        return text
+
+
+def _store_cached_text(key: str, text: str) -> None:
+    """Сохранение распознанного текста в LRU-кэш"""
+    with _ocr_cache_lock:
+        _ocr_cache[key] = text
+        _ocr_cache.move_to_end(key)
+        while len(_ocr_cache) > OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+
 
 class OCREngine:
     """Движок оптического распознавания символов с адаптивными настройками"""
@@ -26,8 +113,67 @@ class OCREngine:
         if tesseract_cmd:
             pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
         
-        from core.image_processor import AdvancedImageProcessor
         self.image_processor = AdvancedImageProcessor()
+        
+        # Экземпляры tesserocr по (поток, язык): API не потокобезопасен, поэтому у каждого
+        # потока пула свой; создаются при первом использовании. Распознавание идет только
+        # в потоках пула (extract_text тоже), иначе потоки запросов Dash оставляли бы здесь
+        # свои экземпляры
+        self._apis: Dict[Tuple[int, str], Any] = {}
+        self._apis_lock = threading.Lock()
+        
+        # Пул потоков распознавания полей (создается при первом пакете)
+        self._executor = None
+    
+    def _tesseract_api(self, lang: str) -> Any:
+        """
+        Загруженный в процесс API Tesseract для языка или None
+        
+        Модели загружаются один раз на движок; без tesserocr (или если
+        он не смог загрузить tessdata) распознавание идет через pytesseract.
+        """
+        if tesserocr is None:
+            return None
+        key = (threading.get_ident(), lang)
+        with self._apis_lock:
+            if key in self._apis:
+                return self._apis[key]
+        
+        try:
+            api = tesserocr.PyTessBaseAPI(lang=lang, oem=TESSERACT_OEM, variables=TESSERACT_VARIABLES)
+        except RuntimeError as e:
+            logger.warning(f"tesserocr не инициализирован для {lang}, используется pytesseract: {e}")
+            api = None
+        with self._apis_lock:
+            self._apis[key] = api
+        return api
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков распознавания (потоки живут вместе с движком, как и их API)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=_ocr_concurrency(),
+                                                thread_name_prefix='ocr')
+        return self._executor
+    
+    def close(self) -> None:
+        """Остановка пула потоков (с ожиданием текущих задач) и освобождение API Tesseract"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._apis_lock:
+            apis = list(self._apis.values())
+            self._apis.clear()
+        for api in apis:
+            if api is not None:
+                api.End()
+    
+    def __del__(self):
+        # Сборщик мусора не должен ждать задачи пула: без блокирующего shutdown.
+        # API остаются за потоками пула и освобождаются вместе с процессом;
+        # для детерминированного освобождения нужен явный close()
+        executor = getattr(self, '_executor', None)
+        if executor is not None:
+            executor.shutdown(wait=False)
     
     def preprocess_region(self, region: Image.Image, ocr_params: Dict, 
                          field_name: str = "", config_org: str = "") -> Image.Image:
@@ -41,40 +187,46 @@ class OCREngine:
             config_org: Организация-эмитент документа
             
         Returns:
-            Image.Image: Предобработанная область
+            Image.Image: Предобработанная область в оттенках серого
         """
+        import cv2
+        
+        processor = self.image_processor
         scale_factor = ocr_params.get('scale_factor', 3)
         contrast_boost = ocr_params.get('contrast_boost', 1.5)
         
-        width, height = region.size
+        # Весь конвейер идет по одному массиву в оттенках серого (OCR все равно
+        # распознает оттенки серого): PIL -> numpy на входе и numpy -> PIL на выходе
+        gray = processor.to_gray_array(region)
+        height, width = gray.shape
         
         # Удаление линий для ФИО в ФинУниверситете
         if field_name == 'full_name' and 'FINUNIV' in config_org:
-            region = self.image_processor.remove_lines_horizontal(region, aggressive=True)
+            gray = processor.remove_lines_horizontal_array(gray, aggressive=True)
         
-        # Масштабирование
+        # Масштабирование: для распознавания бикубической интерполяции достаточно
+        # (LANCZOS4 - 8x8 отсчетов против 4x4 при неотличимом результате OCR),
+        # при малом увеличении - билинейной
         if scale_factor > 1:
             new_size = (width * scale_factor, height * scale_factor)
-            region = region.resize(new_size, Image.LANCZOS)
+            interpolation = cv2.INTER_CUBIC if scale_factor > 2 else cv2.INTER_LINEAR
+            gray = resize_array(gray, new_size, interpolation)
         
-        # Контраст
-        enhancer = ImageEnhance.Contrast(region)
-        region = enhancer.enhance(contrast_boost)
+        # Контраст (для регистрационных номеров - вместе с яркостью, оба шага аффинные)
+        factors = {'contrast': contrast_boost}
+        is_registration_number = field_name == 'registration_number' and scale_factor >= 4
+        if is_registration_number:
+            factors['brightness'] = 1.1
+        gray = processor.enhance_array(gray, factors)
         
-        # Дополнительная обработка для регистрационных номеров
-        if field_name == 'registration_number' and scale_factor >= 4:
-            enhancer = ImageEnhance.Brightness(region)
-            region = enhancer.enhance(1.1)
-            region = region.filter(ImageFilter.MedianFilter(size=3))
-        
-        # Медианный фильтр для удаления шума
-        region = region.filter(ImageFilter.MedianFilter(size=3))
+        # Медианный фильтр для удаления шума (один проход: для регистрационных
+        # номеров раньше шел второй, почти ничего не менявший после первого)
+        gray = cv2.medianBlur(gray, 3)
         
         # Повышение резкости
-        enhancer = ImageEnhance.Sharpness(region)
-        region = enhancer.enhance(1.5)
+        gray = processor.enhance_array(gray, {'sharpness': 1.5})
         
-        return region
+        return processor.from_array(gray)
     
     def extract_text(self, img: Image.Image, box: Tuple[int, int, int, int],
                     field_name: str, config: Any) -> str:
@@ -90,10 +242,81 @@ class OCREngine:
         Returns:
             str: Распознанный текст
         """
+        # Через пул: API tesserocr создаются только в его потоках и освобождаются в close()
+        return self.extract_texts(img, [(field_name, box)], config)[field_name]
+    
+    def extract_texts(self, img: Image.Image, fields: List[Tuple[str, Tuple[int, int, int, int]]],
+                      config: Any) -> Dict[str, str]:
+        """
+        Извлечение текста всех полей документа пакетами - по одному запуску Tesseract
+        на каждое сочетание (язык, PSM)
+        
+        Каждый вызов pytesseract запускает новый процесс tesseract и заново
+        загружает языковые модели, что для небольших полей дороже самого
+        распознавания. Области группы сохраняются в PNG во временный каталог,
+        Tesseract получает файл со списком изображений и распознает их как
+        страницы одного документа, разделяя текст страниц символом FF.
+        
+        Предобработка полей и распознавание групп (с tesserocr - отдельных полей)
+        выполняются в пуле потоков: OpenCV и libtesseract отпускают GIL, а процессы
+        tesseract и так работают параллельно.
+        
+        Args:
+            img: Исходное изображение документа
+            fields: Пары (имя поля, координаты области)
+            config: Конфигурация документа
+            
+        Returns:
+            Dict[str, str]: Распознанный текст по именам полей
+        """
+        if not fields:
+            return {}
+        executor = self._get_executor()
+        
+        # Image.open декодирует пиксели лениво, а загрузка не потокобезопасна:
+        # страница декодируется один раз до того, как потоки пула начнут вырезать поля
+        img.load()
+        
+        prepared = executor.map(lambda field: self._prepare_region(img, field[1], field[0], config),
+                                fields)
+        groups: Dict[Tuple[str, int], List[Tuple[str, Image.Image]]] = {}
+        for (field_name, _), region in zip(fields, prepared):
+            groups.setdefault(self._ocr_settings(field_name, config), []).append((field_name, region))
+        
+        # Языки, для которых tesserocr загрузил модели. Проверка идет в потоках пула,
+        # чтобы API не создавались в потоке вызывающего
+        langs = list({lang for lang, _ in groups})
+        in_process = dict(zip(langs, executor.map(lambda lang: self._tesseract_api(lang) is not None,
+                                                  langs)))
+        
+        # В процессе (tesserocr) каждое поле - отдельная задача, иначе группа - один запуск
+        jobs = []
+        for (lang, psm), regions in groups.items():
+            chunks = [[region] for region in regions] if in_process[lang] else [regions]
+            jobs.extend((chunk, lang, psm) for chunk in chunks)
+        
+        texts = {}
+        for batch_texts in executor.map(lambda job: self._recognize_batch(*job), jobs):
+            texts.update(batch_texts)
+        return texts
+    
+    def _prepare_region(self, img: Image.Image, box: Tuple[int, int, int, int],
+                        field_name: str, config: Any) -> Image.Image:
+        """Вырезание и предобработка области поля в оттенках серого"""
         region = img.crop(box)
         region = self.preprocess_region(region, config.ocr_params, field_name, config.organization)
-        region = region.convert('L')
+        if region.mode != 'L':
+            region = region.convert('L')
+        return region
+    
+    @staticmethod
+    def _ocr_settings(field_name: str, config: Any) -> Tuple[str, int]:
+        """
+        Язык и режим PSM распознавания для поля
         
+        Returns:
+            Tuple[str, int]: (язык Tesseract, PSM)
+        """
         # Выбор режима PSM в зависимости от типа поля
         if field_name == 'full_name':
             if config.document_type == 'diploma':
@@ -107,22 +330,119 @@ class OCREngine:
         else:
             psm = 7
         
+        # Выбор языка распознавания
+        if field_name == 'full_name' or 'date' in field_name:
+            lang = 'rus'
+        elif field_name == 'series_and_number':
+            lang = 'rus+eng'
+        else:
+            lang = 'rus+eng'
+        
+        return lang, psm
+    
+    def _recognize(self, region: Image.Image, lang: str, psm: int, field_name: str) -> str:
+        """Распознавание одной подготовленной области"""
         try:
-            config_str = f'--oem 3 --psm {psm}'
-            
-            # Выбор языка распознавания
-            if field_name == 'full_name' or 'date' in field_name:
-                lang = 'rus'
-            elif field_name == 'series_and_number':
-                lang = 'rus+eng'
-            else:
-                lang = 'rus+eng'
+            api = self._tesseract_api(lang)
+            if api is not None:
+                api.SetPageSegMode(psm)
+                api.SetImage(region)
+                return api.GetUTF8Text().strip()
             
-            text = pytesseract.image_to_string(region, lang=lang, config=config_str)
+            text = pytesseract.image_to_string(region, lang=lang, config=_tesseract_config(psm))
             return text.strip()
         except Exception as e:
             logger.error(f"Ошибка OCR для поля {field_name}: {e}")
             return ""
+    
+    def _recognize_batch(self, regions: List[Tuple[str, Image.Image]],
+                         lang: str, psm: int) -> Dict[str, str]:
+        """
+        Распознавание группы областей с общими настройками с учетом кэша результатов
+        
+        Области, уже распознанные с теми же настройками, берутся из кэша по хэшу
+        пикселей; пустые результаты (в том числе ошибки OCR) не кэшируются.
+        
+        Args:
+            regions: Пары (имя поля, подготовленная область)
+            lang: Язык Tesseract
+            psm: Режим сегментации
+            
+        Returns:
+            Dict[str, str]: Распознанный текст по именам полей
+        """
+        # tesserocr и процесс tesseract могут быть разных версий - результаты не смешиваются
+        backend = 'tesserocr' if self._tesseract_api(lang) is not None else 'tesseract'
+        keys = {field_name: _ocr_cache_key(region, lang, psm, backend) for field_name, region in regions}
+        
+        texts = {}
+        pending = []
+        for field_name, region in regions:
+            cached = _load_cached_text(keys[field_name])
+            if cached is None:
+                pending.append((field_name, region))
+            else:
+                texts[field_name] = cached
+        
+        if pending:
+            recognized = self._run_tesseract(pending, lang, psm)
+            for field_name, text in recognized.items():
+                if text:
+                    _store_cached_text(keys[field_name], text)
+            texts.update(recognized)
+        
+        if len(pending) < len(regions):
+            logger.debug(f"Из кэша OCR: {len(regions) - len(pending)} из {len(regions)} полей")
+        return texts
+    
+    def _run_tesseract(self, regions: List[Tuple[str, Image.Image]],
+                       lang: str, psm: int) -> Dict[str, str]:
+        """
+        Распознавание группы областей с общими настройками одним запуском Tesseract
+        
+        Args:
+            regions: Пары (имя поля, подготовленная область)
+            lang: Язык Tesseract
+            psm: Режим сегментации
+            
+        Returns:
+            Dict[str, str]: Распознанный текст по именам полей
+        """
+        # В процессе (tesserocr) запуск ничего не стоит - пакет через файлы не нужен
+        if len(regions) == 1 or self._tesseract_api(lang) is not None:
+            return {field_name: self._recognize(region, lang, psm, field_name)
+                    for field_name, region in regions}
+        
+        try:
+            with tempfile.TemporaryDirectory(prefix='ocr_batch_') as tmp_dir:
+                image_paths = []
+                for index, (_, region) in enumerate(regions):
+                    image_path = os.path.join(tmp_dir, f"{index}.png")
+                    # Минимальное сжатие: файлы живут до конца вызова
+                    region.save(image_path, compress_level=1)
+                    image_paths.append(image_path)
+                
+                list_path = os.path.join(tmp_dir, 'images.txt')
+                with open(list_path, 'w', encoding='utf-8') as list_file:
+                    list_file.write('\n'.join(image_paths) + '\n')
+                
+                output = pytesseract.image_to_string(list_path, lang=lang,
+                                                     config=_tesseract_config(psm))
+            
+            # Текст каждой страницы завершается символом FF
+            pages = output.split('\x0c')
+            if len(pages) >= len(regions):
+                logger.debug(f"Пакетное OCR ({lang}, psm {psm}): {len(regions)} полей")
+                return {field_name: page.strip()
+                        for (field_name, _), page in zip(regions, pages)}
+            
+            logger.warning(f"Пакетное OCR вернуло {len(pages)} страниц вместо {len(regions)}")
+        except Exception as e:
+            logger.warning(f"Ошибка пакетного OCR ({lang}, psm {psm}): {e}")
+        
+        # Запасной путь: поля по одному
+        return {field_name: self._recognize(region, lang, psm, field_name)
+                for field_name, region in regions}
 
 
 class DocumentProcessor:
@@ -135,7 +455,6 @@ class DocumentProcessor:
         Args:
             tesseract_cmd: Путь к исполняемому файлу Tesseract (опционально)
         """
-        from core.image_processor import AdvancedImageProcessor
         self.image_processor = AdvancedImageProcessor()
         self.ocr_engine = OCREngine(tesseract_cmd)
     
@@ -155,6 +474,14 @@ class DocumentProcessor:
         result = {}
         uncertainties = []
         
+        # Все корректные поля распознаются пакетно, затем разбираются в порядке конфигурации
+        texts = self.ocr_engine.extract_texts(
+            img,
+            [(field_config['name'], field_config['box']) for field_config in config.fields
+             if field_config['box'] and self._is_valid_box(field_config['box'])],
+            config
+        )
+        
         # ИСПРАВЛЕНО: config.fields вместо config.get('fields')
         for field_config in config.fields:
             box = field_config['box']
@@ -165,13 +492,12 @@ class DocumentProcessor:
                 continue
             
             # Валидация координат
-            if not (isinstance(box, (list, tuple)) and len(box) == 4 and 
-                   all(isinstance(x, (int, float)) for x in box)):
+            if not self._is_valid_box(box):
                 logger.warning(f"Некорректные координаты для поля {field_name}: {box}")
                 result[field_name] = "INVALID_BOX"
                 continue
             
-            text = self.ocr_engine.extract_text(img, box, field_name, config)
+            text = texts[field_name]
             
             if field_name == 'series_and_number':
                 series, number, uncertain = config.patterns['series_and_number'](text)
@@ -212,6 +538,12 @@ class DocumentProcessor:
         result['uncertainties'] = uncertainties
         return result
     
+    @staticmethod
+    def _is_valid_box(box: Any) -> bool:
+        """Проверка координат области (x1, y1, x2, y2)"""
+        return (isinstance(box, (list, tuple)) and len(box) == 4 and
+                all(isinstance(x, (int, float)) for x in box))
+    
     def display_image_with_boxes(self, img: Image.Image, fields: List[Dict]) -> Image.Image:
         """
         Отображение изображения с рамками полей
@@ -225,6 +557,7 @@ class DocumentProcessor:
         """
         img_copy = img.copy()
         draw = ImageDraw.Draw(img_copy)
+        font = load_label_font(14)
         
         colors = ['red', 'green', 'blue', 'orange', 'purple', 'cyan']
         
@@ -237,7 +570,7 @@ class DocumentProcessor:
                 draw.rectangle(box, outline=color, width=3)
                 
                 try:
-                    draw.text((box[0], box[1] - 15), field_name, fill=color)
+                    draw.text((box[0], box[1] - 15), field_name, fill=color, font=font)
                 except Exception as e:
                     logger.debug(f"Не удалось добавить текст к полю {field_name}: {e}")
         
@@ -0,0 +1,93 @@
+"""
+Тесты преобразований массивов AdvancedImageProcessor
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+import core.image_processor as image_processor
+from core.image_processor import AdvancedImageProcessor
+
+ENHANCERS = (
+    ('brightness', ImageEnhance.Brightness),
+    ('contrast', ImageEnhance.Contrast),
+    ('color', ImageEnhance.Color),
+    ('sharpness', ImageEnhance.Sharpness),
+)
+
+
+@pytest.fixture
+def page_cache(monkeypatch):
+    """Пустой кэш страниц на 3 страницы 100x100 RGB"""
+    monkeypatch.setattr(image_processor, '_page_cache', image_processor.OrderedDict())
+    monkeypatch.setattr(image_processor, '_page_cache_bytes', 0)
+    monkeypatch.setattr(image_processor, 'PDF_PAGE_CACHE_BYTES', 3 * 100 * 100 * 3)
+
+
+def enhance_with_pil(img, factors):
+    for name, enhancer in ENHANCERS:
+        if name in factors:
+            img = enhancer(img).enhance(factors[name])
+    return np.asarray(img)
+
+
+@pytest.mark.parametrize('mode', ['L', 'RGB'])
+def test_enhance_array_matches_image_enhance(mode):
+    rng = np.random.default_rng(0)
+    shape = (40, 60) if mode == 'L' else (40, 60, 3)
+    arr = rng.integers(0, 256, shape, dtype=np.uint8)
+
+    grid = itertools.product((0.6, 1.0, 1.4, 2.0), (0.5, 1.0, 1.5, 2.5),
+                             (0.5, 1.0, 1.8), (0.5, 1.0, 2.0))
+    for factors in grid:
+        factors = dict(zip(('brightness', 'contrast', 'color', 'sharpness'), factors))
+        expected = enhance_with_pil(Image.fromarray(arr, mode), factors)
+        result = AdvancedImageProcessor.enhance_array(arr, factors)
+
+        assert result.dtype == np.uint8
+        assert np.array_equal(result, expected), factors
+
+
+def test_page_cache_evicts_least_recently_used_by_bytes(page_cache):
+    page = Image.new('RGB', (100, 100))
+    for pdf_hash in ('a', 'b', 'c'):
+        image_processor._store_cached_pages(pdf_hash, [300], [page])
+    # Обращение делает 'a' самым свежим - вытесняется 'b'
+    assert image_processor._load_cached_pages('a', [300]) is not None
+    image_processor._store_cached_pages('d', [300], [page])
+
+    assert image_processor._load_cached_pages('b', [300]) is None
+    for pdf_hash in ('a', 'c', 'd'):
+        assert image_processor._load_cached_pages(pdf_hash, [300]) is not None
+    assert image_processor._page_cache_bytes == 3 * 100 * 100 * 3
+
+
+def test_page_cache_skips_documents_larger_than_limit(page_cache):
+    page = Image.new('RGB', (100, 100))
+    image_processor._store_cached_pages('a', [300], [page])
+    image_processor._store_cached_pages('big', [300], [page] * 4)
+
+    assert image_processor._load_cached_pages('big', [300]) is None
+    assert image_processor._load_cached_pages('a', [300]) is not None
+
+
+def test_page_cache_returns_copies(page_cache):
+    image_processor._store_cached_pages('a', [300], [Image.new('RGB', (100, 100))])
+    image_processor._load_cached_pages('a', [300])[0].putpixel((0, 0), (255, 0, 0))
+
+    assert image_processor._load_cached_pages('a', [300])[0].getpixel((0, 0)) == (0, 0, 0)
+
+
+def test_quality_metrics_use_native_resolution():
+    cv2 = pytest.importorskip('cv2')
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, (1500, 1000), dtype=np.uint8)
+
+    analysis = image_processor.ImageAnalyzer.analyze_image_quality(Image.fromarray(gray, 'L'))
+
+    assert analysis['contrast'] == pytest.approx(gray.std(), rel=1e-4)
+    assert analysis['dynamic_range'] == int(gray.max()) - int(gray.min())
+    assert analysis['sharpness'] == pytest.approx(cv2.Laplacian(gray, cv2.CV_64F).var(), rel=1e-4)
@@ -0,0 +1,56 @@
+"""
+Тесты пакетного распознавания OCREngine через список изображений Tesseract
+"""
+
+import pytest
+from PIL import Image
+
+pytest.importorskip('pytesseract')
+
+import core.ocr_engine as ocr_engine
+from core.ocr_engine import OCREngine
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    # Пакетный путь используется только без tesserocr
+    monkeypatch.setattr(ocr_engine, 'tesserocr', None)
+    engine = OCREngine()
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def regions():
+    return [(f'field{index}', Image.new('L', (40 + index, 20), 255)) for index in range(3)]
+
+
+def fake_tesseract(pages_per_list, calls):
+    """image_to_string: список файлов -> pages_per_list страниц, одно изображение -> размер"""
+    def image_to_string(image, lang, config):
+        if isinstance(image, str):
+            calls.append('list')
+            return ''.join(f' page{index}\n\x0c' for index in range(pages_per_list))
+        calls.append('single')
+        return f'{image.width}\n'
+    return image_to_string
+
+
+def test_batch_output_is_split_on_form_feed(engine, regions, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ocr_engine.pytesseract, 'image_to_string', fake_tesseract(3, calls))
+
+    texts = engine._run_tesseract(regions, 'rus', 7)
+
+    assert texts == {'field0': 'page0', 'field1': 'page1', 'field2': 'page2'}
+    assert calls == ['list']
+
+
+def test_short_batch_output_falls_back_to_single_fields(engine, regions, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ocr_engine.pytesseract, 'image_to_string', fake_tesseract(1, calls))
+
+    texts = engine._run_tesseract(regions, 'rus', 7)
+
+    assert texts == {'field0': '40', 'field1': '41', 'field2': '42'}
+    assert calls == ['list', 'single', 'single', 'single']
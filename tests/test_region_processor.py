@@ -0,0 +1,72 @@
+"""
+Тесты пакетной предобработки полей RegionProcessor
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import core.image_processor as image_processor
+from core.image_processor import RegionProcessor
+
+
+@pytest.fixture
+def page():
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (200, 300, 3), dtype=np.uint8), 'RGB')
+
+
+@pytest.fixture
+def field_cache(monkeypatch):
+    """Пустой кэш полей на 3 области 100x50 в оттенках серого"""
+    monkeypatch.setattr(image_processor, '_field_cache', image_processor.OrderedDict())
+    monkeypatch.setattr(image_processor, '_field_cache_bytes', 0)
+    monkeypatch.setattr(image_processor, 'FIELD_CACHE_BYTES', 3 * 100 * 50)
+
+
+@pytest.mark.parametrize('box', [
+    (20, 30, 120, 60),      # внутри страницы
+    (250, 180, 340, 230),   # выходит за правый и нижний край
+    (-15, -10, 40, 25),     # выходит за левый и верхний край
+])
+def test_batch_matches_single_field(page, box):
+    processor = RegionProcessor()
+    single = processor.preprocess_region_for_field(page, box, 'full_name')
+    batch = processor.preprocess_regions_batch(page, [box], ['full_name'])['full_name']
+
+    assert batch.size == single.size
+    assert np.array_equal(np.asarray(batch), np.asarray(single))
+
+
+def test_batch_rejects_duplicate_field_names(page):
+    with pytest.raises(ValueError):
+        RegionProcessor().preprocess_regions_batch(
+            page, [(0, 0, 50, 20), (60, 0, 110, 20)], ['full_name', 'full_name'])
+
+
+def test_field_cache_evicts_least_recently_used_by_bytes(field_cache):
+    region = Image.new('L', (100, 50))
+    for key in ('a', 'b', 'c'):
+        image_processor._store_cached_field(key, region)
+    # Обращение делает 'a' самым свежим - вытесняется 'b'
+    assert image_processor._load_cached_field('a') is not None
+    image_processor._store_cached_field('d', region)
+
+    assert image_processor._load_cached_field('b') is None
+    for key in ('a', 'c', 'd'):
+        assert image_processor._load_cached_field(key) is not None
+    assert image_processor._field_cache_bytes == 3 * 100 * 50
+
+
+def test_repeated_field_is_served_from_cache(page, field_cache, monkeypatch):
+    monkeypatch.setattr(image_processor, 'FIELD_CACHE_BYTES', 64 * 1024 * 1024)
+    processor = RegionProcessor()
+    first = processor.preprocess_region_for_field(page, (20, 30, 120, 60), 'full_name')
+    assert len(image_processor._field_cache) == 1
+
+    # Результат из кэша - копия: изменения вызывающего кода не портят кэш
+    first.paste(0, (0, 0) + first.size)
+    second = processor.preprocess_region_for_field(page, (20, 30, 120, 60), 'full_name')
+
+    assert len(image_processor._field_cache) == 1
+    assert np.asarray(second).any()
@@ -28,7 +28,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 
 from core.ocr_engine import DocumentProcessor
-from core.image_processor import AdvancedImageProcessor
+from core.image_processor import AdvancedImageProcessor, pil_to_base64
 from core.config import get_config, get_available_configs, UncertaintyEngine, get_field_description
 
 
@@ -369,7 +369,7 @@ def get_config_options_grouped() -> List[Dict]:
 
 def create_interactive_plotly_image(img: Image.Image, boxes: Dict = None) -> go.Figure:
     """Создание интерактивного изображения"""
-    img_array = np.array(img)
+    img_array = np.asarray(img)
     
     fig = go.Figure()
     fig.add_trace(go.Image(z=img_array))
@@ -430,14 +430,15 @@ def setup_callbacks(app, doc_processor, image_processor):
             content_type, content_string = contents.split(',')
             decoded = base64.b64decode(content_string)
             
-            images = image_processor.convert_pdf_from_bytes(decoded)
+            # Страницы сразу уменьшаются до max_dimension - рендерим с минимально нужным DPI
+            images = image_processor.convert_pdf_from_bytes(
+                decoded, target_max_dim=image_processor.max_dimension)
             
             if not images:
                 return None, None, True, dbc.Alert("Ошибка загрузки", color="danger", className="small")
             
             images_b64 = []
-            for img in images:
-                img_resized = image_processor.resize_image(img)
+            for img_resized in image_processor.process_pages_parallel(images, image_processor.resize_image):
                 buffer = io.BytesIO()
                 img_resized.save(buffer, format='PNG')
                 img_b64 = base64.b64encode(buffer.getvalue()).decode()
@@ -624,10 +625,8 @@ def setup_callbacks(app, doc_processor, image_processor):
                     
                     if box:
                         thumbnail = doc_processor.crop_field_thumbnail(img, box)
-                        thumb_buffer = io.BytesIO()
-                        thumbnail.save(thumb_buffer, format='PNG')
-                        thumb_b64 = base64.b64encode(thumb_buffer.getvalue()).decode()
-                        result['field_thumbnails'][field_name] = thumb_b64
+                        # Миниатюры только показываются - JPEG вместо PNG
+                        result['field_thumbnails'][field_name] = pil_to_base64(thumbnail, format='JPEG', quality=85)
                 
                 all_results.append(result)
             
@@ -895,7 +894,7 @@ def create_editable_page_table(page_result: Dict, config) -> dbc.Card:
                 ], style={'width': '12%', 'fontSize': '0.9rem'}),
                 html.Td([
                     html.Img(
-                        src=f"data:image/png;base64,{thumb_b64}",
+                        src=f"data:image/jpeg;base64,{thumb_b64}",
                         style={'maxWidth': '100%', 'maxHeight': '150px', 'objectFit': 'contain'},
                         className="border"
                     ) if thumb_b64 else "—"
@@ -950,7 +949,7 @@ def create_editable_page_table(page_result: Dict, config) -> dbc.Card:
                 ], style={'width': '12%', 'fontSize': '0.9rem'}),
                 html.Td([
                     html.Img(
-                        src=f"data:image/png;base64,{thumb_b64}",
+                        src=f"data:image/jpeg;base64,{thumb_b64}",
                         style={'maxWidth': '100%', 'maxHeight': '150px', 'objectFit': 'contain'},
                         className="border"
                     ) if thumb_b64 else "—"
@@ -7,7 +7,7 @@ import dash
 from dash import dcc, html, Input, Output, State, ALL, MATCH
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import io
 import base64
 import json
@@ -262,13 +262,13 @@ class MarkupTool:
     
     def draw_boxes_on_image(self, img: Image.Image, boxes: Dict[str, Tuple]) -> Image.Image:
         """Отрисовка рамок полей на изображении"""
+        from core.image_processor import load_label_font
+        
         img_with_boxes = img.copy()
         draw = ImageDraw.Draw(img_with_boxes)
         
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)
-        except:
-            font = ImageFont.load_default()
+        # Шрифт загружается с диска один раз, а не при каждой перерисовке
+        font = load_label_font(16)
         
         for field_name, box in boxes.items():
             if not box or len(box) != 4: